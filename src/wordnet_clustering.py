@@ -1,8 +1,14 @@
 import nltk
 from nltk.corpus import wordnet as wn
+from nltk.corpus.reader.wordnet import Synset
 import argparse
 import sys
-import copy
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache, partial
+
+
+# size of the buffer used when writing the results files (1 MiB)
+WRITE_BUFFER_SIZE = 1 << 20
 
 
 def get_words(file_path):
@@ -14,21 +20,19 @@ def get_words(file_path):
     :return: words:     set of the words read from file
     """
 
-    words = set()
-    count = 0
-
     try:
         with open(file_path, 'r', encoding='utf8') as file:
-            for counter, line in enumerate(file):
-                for word in line.split():
-                    words.add(word)
-                    count += 1
+            # the whole content is split at once
+            tokens = file.read().split()
     except Exception as e:
         print(str(e))
         exit(1)
 
+    words = set(tokens)
+
     print('Total number of words: ' + str(len(words)) + '.')
-    if count != len(words):
+    # repeated words are detected comparing the number of tokens read with the number of distinct words
+    if len(tokens) != len(words):
         print('Warning: some of the words in the file are repeated.')
 
     return words
@@ -42,13 +46,191 @@ def store_words(file_path, words_set):
     :param words_set:   set containing the words to be stored in file
     """
 
-    with open(file_path, 'w', encoding='utf8') as file:
-        for word in words_set:
-            file.write(word + '\n')
+    with open(file_path, 'w', encoding='utf8', buffering=WRITE_BUFFER_SIZE) as file:
+        file.writelines(word + '\n' for word in words_set)
+
+
+@lru_cache(maxsize=None)
+def _synset(name):
+    """
+    This function returns the Wordnet synset identified by name. The lookup is memoized, so that each synset is
+    resolved only once.
+
+    :param name:    name of the synset (e.g. 'entity.n.01').
+    :return:        the corresponding Wordnet synset.
+    """
+
+    return wn.synset(name)
+
+
+@lru_cache(maxsize=None)
+def _min_depth(name):
+    """
+    This function returns the minimum depth of the synset identified by name. The value is memoized, so that every
+    synset shared among the hypernyms of different words is traversed only once.
+
+    :param name:    name of the synset (e.g. 'entity.n.01').
+    :return:        minimum depth of the synset in the Wordnet hypernyms tree.
+    """
+
+    return _synset(name).min_depth()
+
+
+# table of the hypernyms closures already computed, indexed by synset name
+_closures = dict()
+
+
+def _visit_closure(synset):
+    """
+    This function computes the names of all the synsets in the hypernyms closure of the synset received, through a
+    plain visit of the hypernyms graph. The closures already stored in the _closures table are reused.
+
+    :param synset:  Wordnet synset.
+    :return:        frozenset of the names of the hypernyms of the synset.
+    """
+
+    # the hypernyms method is bound once, instead of dispatching a lambda function for each edge
+    hypernyms = Synset.hypernyms
+
+    # iterative depth first visit of the hypernyms graph
+    closure = set()
+    visited = {synset}
+    stack = [synset]
+    while stack:
+        for hypernym in hypernyms(stack.pop()):
+            if hypernym not in visited:
+                visited.add(hypernym)
+                hypernym_name = sys.intern(hypernym.name())
+                closure.add(hypernym_name)
+                if hypernym_name in _closures:
+                    # the rest of this subgraph has already been visited
+                    closure |= _closures[hypernym_name]
+                else:
+                    stack.append(hypernym)
+
+    # the synset itself is not part of its closure
+    closure.discard(sys.intern(synset.name()))
+    return frozenset(closure)
+
+
+def _hypernyms_closure(name):
+    """
+    This function returns the names of all the synsets in the hypernyms closure of the synset identified by name.
+    The hypernyms graph is visited in post-order and the closure of every synset met is stored in the _closures table,
+    built from the closures of its direct hypernyms, so that each synset is expanded only once across all the calls.
+
+    :param name:    name of the synset (e.g. 'dog.n.01').
+    :return:        frozenset of the names of the hypernyms of the synset.
+    """
+
+    if name in _closures:
+        return _closures[name]
+
+    # the hypernyms method is bound once, instead of dispatching a lambda function for each edge
+    hypernyms = Synset.hypernyms
+
+    # each entry holds a synset, its name and, once expanded, the names of its direct hypernyms
+    in_progress = set()
+    stack = [(_synset(name), name, None)]
+    while stack:
+        synset, synset_name, direct = stack.pop()
+        if synset_name in _closures:
+            continue
+
+        if direct is None:
+            if synset_name in in_progress:
+                continue
+            in_progress.add(synset_name)
+            # names are interned, since they are shared among many clusters and words' sets
+            parents = [(hypernym, sys.intern(hypernym.name())) for hypernym in hypernyms(synset)]
+            # the synset is closed after all its hypernyms
+            stack.append((synset, synset_name, [parent_name for _, parent_name in parents]))
+            for parent, parent_name in parents:
+                if parent_name not in _closures and parent_name not in in_progress:
+                    stack.append((parent, parent_name, None))
+            continue
+
+        if all(parent_name in _closures for parent_name in direct):
+            closure = set(direct)
+            for parent_name in direct:
+                closure |= _closures[parent_name]
+            closure.discard(synset_name)
+            _closures[synset_name] = frozenset(closure)
+        else:
+            # a hypernym still in progress means the synset lies on a cycle, its closure is computed by a plain visit
+            _closures[synset_name] = _visit_closure(synset)
+
+    return _closures[name]
+
+
+@lru_cache(maxsize=None)
+def _valid_ancestors(name, min_depth=0):
+    """
+    This function returns the names of the synset identified by name and of all its hypernyms, filtered by the minimum
+    depth requirement. The value is memoized, so that the ancestors shared by different words are filtered only once.
+
+    :param name:        name of the synset (e.g. 'dog.n.01').
+    :param min_depth:   minimum depth allow for an hypernym to be eligible as a cluster label
+    :return:            frozenset of the names of the synsets at valid depth.
+    """
+
+    # the synset itself is also considered for the clustering purpose
+    candidates = _hypernyms_closure(name) | {name}
+    # every synset has a non negative depth, so no check is needed with the default requirement
+    if min_depth <= 0:
+        return candidates
+    return frozenset(x for x in candidates if _min_depth(x) >= min_depth)
+
+
+def _cluster_words(words_set, min_depth=0):
+    """
+    This function performs the clustering described in get_clusters on the words received, in the current process.
+
+    :param words_set:   collection of words to be clustered.
+    :param min_depth:   minimum depth allow for an hypernym to be eligible as a cluster label
+    :return:            the same tuple returned by get_clusters, restricted to the words received.
+    """
+
+    # words grouped by their set of clusters, since many words share the same hypernyms
+    groups = dict()
+    clusters = dict()
+    words_to_clusters = dict()
+    not_inserted = set()
+    not_found = set()
+
+    for word in words_set:
+
+        # meanings of the word (synsets)
+        synsets = wn.synsets(word)
+
+        # union of the synsets and their hypernyms at valid depth, for every meaning
+        hypers_set = frozenset().union(*(_valid_ancestors(sys.intern(synset.name()), min_depth) for synset in synsets))
+
+        # checking if valid synsets are found and if valid
+        if synsets:
+            if len(hypers_set) <= 0:
+                # inserting the word in the set of strings recognized as Wordnet words, but with no valid depth in their
+                # hypernyms closure set
+                not_inserted.add(word)
+            else:
+                # grouping the word with the others having the same clusters
+                groups.setdefault(hypers_set, []).append(word)
+        else:
+            # inserting the word in the set of stirngs not belonging to the Wordnet collection
+            not_found.add(word)
+
+    for hypers_set, words in groups.items():
+        for key in hypers_set:
+            # inserting the whole group of words in the clusters found
+            clusters.setdefault(key, set()).update(words)
+        for word in words:
+            # associating the clusters found to the word
+            words_to_clusters[word] = set(hypers_set)
 
+    return clusters, words_to_clusters, not_inserted, not_found
 
 
-def get_clusters(words_set, min_depth=0):
+def get_clusters(words_set, min_depth=0, workers=1):
     """
     This function generates the clusters of words following a simple strategy.
     For each word from the initial pool the set of synsets associated to the word itself and to all its hypernyms
@@ -60,6 +242,8 @@ def get_clusters(words_set, min_depth=0):
 
     :param words_set:   set of words to be clustered.
     :param min_depth:   minimum depth allow for an hypernym to be eligible as a cluster label
+    :param workers:     number of processes among which the words are split. With a single worker the clustering is
+                        performed in the current process.
     :return clusters:   dictionary having as keys strings identifying the clusters and generated as the Wordnet words
                         composing the corresponding synsets. The values are sets of words, retrieved from the words_set
                         parameter, members of the clusters.
@@ -70,58 +254,29 @@ def get_clusters(words_set, min_depth=0):
     :return not_found:  set of words from the words_set parameter that haven't been recognized in the Wordnet collection
     """
 
+    if workers <= 1:
+        return _cluster_words(words_set, min_depth)
+
     clusters = dict()
     words_to_clusters = dict()
     not_inserted = set()
     not_found = set()
 
-    # lambda function used for the Wordnet clsure method
-    hyp = lambda s:s.hypernyms()
-
-    for word in words_set:
-
-        found = False
-        hypers_set = set()
-
-        # for each meaning of the word (synset)
-        for synset in wn.synsets(word):
-
-            found = True
-
-            # the synset itself is also considered for the clustering purpose
-            # check if the depth is valid
-            if synset.min_depth() >= min_depth:
-                # adding the synset to the list
-                hypers_set.add(synset)
-
-            # for each hypernym related to that meaning
-            for hypernym in synset.closure(hyp):
-                # check if the depth is valid
-                if hypernym.min_depth() >= min_depth:
-                    # adding the synset to the list
-                    hypers_set.add(hypernym)
-
-        # checking if valid synsets are found and if valid
-        if found:
-            if len(hypers_set) <= 0:
-                # inserting the word in the set of strings recognized as Wordnet words, but with no valid depth in their
-                # hypernyms closure set
-                not_inserted.add(word)
-            else:
-                # convertung synset id in a string showing the words by which its concept is identified
-                words_to_clusters[word] = set()
-                for x in hypers_set:
-                    key = x.name()
-                    # inserting word in the clusters found
-                    if key not in clusters:
-                        clusters[key] = set()
-                    if word not in clusters[key]:
-                        clusters[key].add(word)
-                    # associating the clusters found to the word
-                        words_to_clusters[word].add(key)
-        else:
-            # inserting the word in the set of stirngs not belonging to the Wordnet collection
-            not_found.add(word)
+    # the words are split in one chunk per worker, each worker clusters its own chunk
+    words_list = list(words_set)
+    chunks = [words_list[i::workers] for i in range(workers)]
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # merging the partial results, each word belongs to a single chunk
+        for chunk_clusters, chunk_words_to_clusters, chunk_not_inserted, chunk_not_found in \
+                executor.map(partial(_cluster_words, min_depth=min_depth), chunks):
+            # names come back from the workers as new strings, so they are interned again
+            for key, members in chunk_clusters.items():
+                clusters.setdefault(sys.intern(key), set()).update(members)
+            for word, keys in chunk_words_to_clusters.items():
+                words_to_clusters[word] = {sys.intern(key) for key in keys}
+            not_inserted |= chunk_not_inserted
+            not_found |= chunk_not_found
 
     return clusters, words_to_clusters, not_inserted, not_found
 
@@ -145,49 +300,32 @@ def filter_by_size(clusters, words_to_clusters=None, max_size=sys.maxsize, min_s
     :return removed: set of words removed completely from the clustering due to clusters' sizes requirements
     """
 
-    new_clusters = dict()
-    new_words_to_clusters = copy.deepcopy(words_to_clusters)
-    removed = set()
-
-    # for each cluster
-    for element in clusters.items():
-        # size is compared with threshold
-        if len(element[1]) > max_size or len(element[1]) < min_size:
-
-            # for each word in the cluster
-            for word in element[1]:
-
-                if new_words_to_clusters is not None:
-                    # updating the words to clusters structure accordingly
-                    if word in new_words_to_clusters:
-                        if element[0] in new_words_to_clusters[word]:
-                            new_words_to_clusters[word].discard(element[0])
-                        if len(new_words_to_clusters[word]) <= 0:
-                            del new_words_to_clusters[word]
-                            removed.add(word)
-                    else:
-                        print('Warning: Inconsistency has been found between clusters '
-                              'and the words to clusters structures.')
-        else:
-            new_clusters[element[0]] = element[1]
-
-    return new_clusters, new_words_to_clusters, removed
+    # no cluster can be filtered out with the default size range
+    if max_size >= sys.maxsize and min_size <= 0:
+        new_words_to_clusters = None
+        if words_to_clusters is not None:
+            new_words_to_clusters = {word: set(keys) for word, keys in words_to_clusters.items()}
+        return dict(clusters), new_words_to_clusters, set()
 
+    # names of the clusters whose size is in the allowed range
+    survivors = {key for key, members in clusters.items() if min_size <= len(members) <= max_size}
+    new_clusters = {key: clusters[key] for key in survivors}
 
+    new_words_to_clusters = None
+    removed = set()
 
-def get_counter_from_dict(collection):
-    """
-    This function given a dictionary having set of strings as values, return the corresponding list of tuples having the keys as first
-    element and the dimension of the associated collection as second one
+    if words_to_clusters is not None:
+        # updating the words to clusters structure accordingly, dropping the words left without clusters
+        new_words_to_clusters = dict()
+        for word, keys in words_to_clusters.items():
+            kept = keys & survivors
+            if kept:
+                new_words_to_clusters[word] = kept
+            else:
+                removed.add(word)
 
-    :param collection: dictionary having collections of strings as values.
-    :return result: list of tuples.
-    """
+    return new_clusters, new_words_to_clusters, removed
 
-    result = list()
-    for x in collection.items():
-        result.append((x[0], len(x[1])))
-    return result
 
 
 def store_clusters_ranking(file_path, clusters):
@@ -198,13 +336,14 @@ def store_clusters_ranking(file_path, clusters):
 
     """
 
-    with open(file_path, 'w', encoding='utf8') as sorted_file:
-        elements_counter = get_counter_from_dict(clusters)
-        counter = 0
-        for element in sorted(elements_counter, key=lambda kv: kv[1], reverse=True):
-            counter += 1
-            sorted_file.write(str(counter) + ')  ' + element[0] + ': ' + str(element[1]) + ' elements\n\t' +
-                              str(clusters[element[0]]) + '\n\n')
+    # the whole ranking is assembled in memory and written at once
+    sorted_clusters = sorted(clusters.items(), key=lambda kv: len(kv[1]), reverse=True)
+    # members are listed in alphabetical order, so that the output is deterministic
+    parts = [f'{counter})  {name}: {len(members)} elements\n\t{{{", ".join(sorted(members))}}}\n\n'
+             for counter, (name, members) in enumerate(sorted_clusters, 1)]
+
+    with open(file_path, 'w', encoding='utf8', buffering=WRITE_BUFFER_SIZE) as sorted_file:
+        sorted_file.write(''.join(parts))
 
 
 def get_listed(clusters):
@@ -219,112 +358,132 @@ def get_listed(clusters):
 
     readable_clusters = dict()
 
-    for element in clusters.items():
+    for name, members in clusters.items():
 
         # all synsets lemmas are used as key
-        lemmas = list(wn.synset(element[0]).lemma_names())
-        lemmas.sort()
+        lemmas = sorted(_synset(name).lemma_names())
         # constructing the key string
-        key = '[synset depth = ' + str(wn.synset(element[0]).min_depth()) + '] '
-        key += ', '.join(iter(lemmas))
-        readable_clusters[key] = element[1]
+        key = f'[synset depth = {_min_depth(name)}] ' + ', '.join(lemmas)
+        readable_clusters[sys.intern(key)] = members
 
     return readable_clusters
 
 
-parser = argparse.ArgumentParser(description='Applies Wordnet based algorithm to group words from the file selected '
-                                             'into meaningful clusters related to hypernyms synsets.')
-parser.add_argument(dest='words_path',
-                    action='store',
-                    nargs=1,
-                    type=str,
-                    help='Path of the file storing the dataset to be analyzed.'
-                    )
-parser.add_argument(dest='results_path',
-                    action='store',
-                    nargs=1,
-                    type=str,
-                    help='Path of the file where to store results.'
-                    )
-parser.add_argument('-d', '--min_allowed_depth',
-                    dest='min_allowed_depth',
-                    action='store',
-                    nargs=1,
-                    type=int,
-                    help='Lowest value allowed for the depth of an hypernym used as a cluster.'
-                    )
-parser.add_argument('-x', '--max_cluster_size',
-                    dest='max_cluster_size',
-                    action='store',
-                    nargs=1,
-                    type=int,
-                    help='Optional argument to specify the maximum allowed size for a cluster.'
-                    )
-parser.add_argument('-m', '--min_cluster_size',
-                    dest='min_cluster_size',
-                    action='store',
-                    nargs=1,
-                    type=int,
-                    help='Optional argument to specify the minimum allowed size for a cluster.'
-                    )
-
-
-# parsing arguments
-args = parser.parse_args()
-
-words_path = args.words_path[0]
-result_path = args.results_path[0]
-min_depth = 0
-if args.min_allowed_depth is not None:
-    min_depth = args.min_allowed_depth[0]
-max_size = sys.maxsize
-if args.max_cluster_size is not None:
-    max_size = args.max_cluster_size[0]
-min_size = 0
-if args.min_cluster_size is not None:
-    max_size = args.min_cluster_size[0]
-
-# downloading wordnet
-nltk.download('wordnet')
-nltk.download('omw')
-
-# reading list of words
-words = get_words(words_path)
-
-# clustering
-print("\nGenerating clusters...")
-clusters, words_to_clusters, excluded_by_depth, not_found = get_clusters(words, min_depth)
-
-# filtering the clusters with invalid size
-clusters, words_to_clusters, excluded_by_size = filter_by_size(clusters, words_to_clusters, max_size, min_size)
-
-# printing resulting info
-print("\n\nNumber of words: "+ str(len(words)))
-print("Number of clusters: "+str(len(clusters)))
-print("\nNumber of words fltered by hypernyms/synsets depth: " + str(len(excluded_by_depth)))
-print("Number of words fltered by clusters' sizes: " + str(len(excluded_by_size)))
-print("Number of words not recognized as Wordnet collection's element: " + str(len(not_found)))
-
-# converting keys in listed form
-clusters = get_listed(clusters)
-
-# storing clusters ranking in files
-# file name is created including the values of the parameteres used
-# firstly the file extension if present is removed
-dot_index = result_path.rfind(".")
-if dot_index != -1:
-    result_path = result_path[:dot_index]
-file_descr = '_mindepth' + str(min_depth)
-if args.max_cluster_size is not None:
-    file_descr += "_maxsz" + str(max_size)
-if args.min_cluster_size is not None:
-    file_descr += "_minsz" + str(min_size)
-result_path += file_descr + '.txt'
-
-# storing lis of excluded words in file
-store_words('words_excluded_by_depth' + file_descr + '.txt', excluded_by_depth)
-store_words('words_excluded_by_size' + file_descr + '.txt', excluded_by_size)
-store_words('words_not_found' + file_descr + '.txt', not_found)
-
-# storing clusters in txt file
-store_clusters_ranking(result_path, clusters)
+def main():
+    """
+    This function parses the command line arguments, clusters the words read from the input file and stores the
+    results in files.
+    """
+
+    parser = argparse.ArgumentParser(description='Applies Wordnet based algorithm to group words from the file '
+                                                 'selected into meaningful clusters related to hypernyms synsets.')
+    parser.add_argument(dest='words_path',
+                        action='store',
+                        nargs=1,
+                        type=str,
+                        help='Path of the file storing the dataset to be analyzed.'
+                        )
+    parser.add_argument(dest='results_path',
+                        action='store',
+                        nargs=1,
+                        type=str,
+                        help='Path of the file where to store results.'
+                        )
+    parser.add_argument('-d', '--min_allowed_depth',
+                        dest='min_allowed_depth',
+                        action='store',
+                        nargs=1,
+                        type=int,
+                        help='Lowest value allowed for the depth of an hypernym used as a cluster.'
+                        )
+    parser.add_argument('-x', '--max_cluster_size',
+                        dest='max_cluster_size',
+                        action='store',
+                        nargs=1,
+                        type=int,
+                        help='Optional argument to specify the maximum allowed size for a cluster.'
+                        )
+    parser.add_argument('-m', '--min_cluster_size',
+                        dest='min_cluster_size',
+                        action='store',
+                        nargs=1,
+                        type=int,
+                        help='Optional argument to specify the minimum allowed size for a cluster.'
+                        )
+    parser.add_argument('-w', '--workers',
+                        dest='workers',
+                        action='store',
+                        nargs=1,
+                        type=int,
+                        help='Optional argument to specify the number of processes used for the clustering.'
+                        )
+
+    # parsing arguments
+    args = parser.parse_args()
+
+    words_path = args.words_path[0]
+    result_path = args.results_path[0]
+    min_depth = 0
+    if args.min_allowed_depth is not None:
+        min_depth = args.min_allowed_depth[0]
+    max_size = sys.maxsize
+    if args.max_cluster_size is not None:
+        max_size = args.max_cluster_size[0]
+    min_size = 0
+    if args.min_cluster_size is not None:
+        min_size = args.min_cluster_size[0]
+    workers = 1
+    if args.workers is not None:
+        workers = args.workers[0]
+
+    # downloading wordnet, only if the corpora are not already available
+    for corpus in ('wordnet', 'omw'):
+        try:
+            nltk.data.find('corpora/' + corpus)
+        except LookupError:
+            nltk.download(corpus)
+
+    # reading list of words
+    words = get_words(words_path)
+
+    # clustering
+    print("\nGenerating clusters...")
+    clusters, words_to_clusters, excluded_by_depth, not_found = get_clusters(words, min_depth, workers)
+
+    # filtering the clusters with invalid size
+    clusters, words_to_clusters, excluded_by_size = filter_by_size(clusters, words_to_clusters, max_size, min_size)
+
+    # printing resulting info
+    print("\n\nNumber of words: "+ str(len(words)))
+    print("Number of clusters: "+str(len(clusters)))
+    print("\nNumber of words fltered by hypernyms/synsets depth: " + str(len(excluded_by_depth)))
+    print("Number of words fltered by clusters' sizes: " + str(len(excluded_by_size)))
+    print("Number of words not recognized as Wordnet collection's element: " + str(len(not_found)))
+
+    # converting keys in listed form
+    clusters = get_listed(clusters)
+
+    # storing clusters ranking in files
+    # file name is created including the values of the parameteres used
+    # firstly the file extension if present is removed
+    dot_index = result_path.rfind(".")
+    if dot_index != -1:
+        result_path = result_path[:dot_index]
+    file_descr = '_mindepth' + str(min_depth)
+    if args.max_cluster_size is not None:
+        file_descr += "_maxsz" + str(max_size)
+    if args.min_cluster_size is not None:
+        file_descr += "_minsz" + str(min_size)
+    result_path += file_descr + '.txt'
+
+    # storing lis of excluded words in file
+    store_words('words_excluded_by_depth' + file_descr + '.txt', excluded_by_depth)
+    store_words('words_excluded_by_size' + file_descr + '.txt', excluded_by_size)
+    store_words('words_not_found' + file_descr + '.txt', not_found)
+
+    # storing clusters in txt file
+    store_clusters_ranking(result_path, clusters)
+
+
+if __name__ == '__main__':
+    main()